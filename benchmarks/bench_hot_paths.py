@@ -0,0 +1,208 @@
+"""Benchmarks for the order, menu and auth hot paths.
+
+Run from the repository root:
+
+    python3 -m benchmarks.bench_hot_paths --scale 1k --output bench.json
+    python3 -m benchmarks.bench_hot_paths --scale 1k --baseline bench.json
+
+The database is seeded with synthetic users, menu items and orders in a
+temporary directory, so the working copy's food_delivery.db is never touched.
+Results are written as JSON; with --baseline the run is compared against a
+stored result and the exit code is 1 if any operation regressed.
+
+Operations that read every order (get_all_orders) look up each order's items
+with a scan of order_items, so one call grows quadratically with the order
+count: about 15 minutes at 100k orders. They run by default only at scales of
+up to FULL_SCAN_MAX_ORDERS orders, and --scan-repeat times rather than
+--repeat; name them in --ops to force them at a larger scale. With the default
+operations a 100k run takes about 10 seconds and a 1m run about a minute.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from src.food_delivery import (
+    AuthManager,
+    MenuManager,
+    OrderManager,
+    hash_password,
+    setup_database
+)
+
+# scale name -> (users, menu items, orders)
+SCALES = {
+    '1k': (100, 50, 1000),
+    '100k': (10000, 500, 100000),
+    '1m': (100000, 1000, 1000000),
+}
+
+# login is the cold path (full password hash check); login_warm checks an
+# already issued session token.
+OPERATIONS = ['create_order', 'get_order', 'get_user_orders', 'get_all_orders', 'get_menu', 'login', 'login_warm']
+
+FULL_SCAN_OPERATIONS = ['get_all_orders']
+FULL_SCAN_MAX_ORDERS = 10000
+
+BENCH_PASSWORD = 'bench-password'
+
+def seed_database(db_path, scale, seed=0):
+    num_users, num_menu_items, num_orders = SCALES[scale]
+    rng = random.Random(seed)
+    # Hashing once and sharing the result keeps seeding fast; logins still pay the full check.
+    password_hash = hash_password(BENCH_PASSWORD)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO menu (name, price) VALUES (?, ?)",
+                       ((f"Item {i}", round(rng.uniform(1, 30), 2)) for i in range(num_menu_items)))
+    cursor.executemany("INSERT INTO users (username, password, user_type) VALUES (?, ?, ?)",
+                       ((f"bench_user_{i}", password_hash, 'customer') for i in range(num_users)))
+    cursor.execute("SELECT id FROM users WHERE user_type = 'customer'")
+    user_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT id FROM menu")
+    menu_ids = [row[0] for row in cursor.fetchall()]
+    start = datetime.now() - timedelta(days=30)
+    step = timedelta(days=30) / num_orders
+    orders = []
+    for i in range(num_orders):
+        order_time = (start + step * i).strftime("%Y-%m-%d %H:%M:%S")
+        orders.append((rng.choice(user_ids), order_time, 'takeaway', 'done', None, 0))
+    cursor.executemany("""
+        INSERT INTO orders (user_id, order_time, delivery_type, status, assigned_agent, time_remaining)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, orders)
+    cursor.execute("SELECT id FROM orders")
+    order_ids = [row[0] for row in cursor.fetchall()]
+    cursor.executemany("INSERT INTO order_items (order_id, menu_item_id, quantity) VALUES (?, ?, ?)",
+                       ((order_id, rng.choice(menu_ids), rng.randint(1, 3))
+                        for order_id in order_ids for _ in range(2)))
+    conn.commit()
+    conn.close()
+    return user_ids, menu_ids, order_ids
+
+def time_operation(func, repeat):
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    mean_ms = statistics.mean(samples)
+    return {
+        'runs': repeat,
+        'min_ms': samples[0],
+        'mean_ms': mean_ms,
+        'median_ms': statistics.median(samples),
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'max_ms': samples[-1],
+        'ops_per_s': 1000 / mean_ms if mean_ms else 0.0,
+    }
+
+def default_operations(scale):
+    if SCALES[scale][2] <= FULL_SCAN_MAX_ORDERS:
+        return list(OPERATIONS)
+    return [name for name in OPERATIONS if name not in FULL_SCAN_OPERATIONS]
+
+def run_benchmarks(scale, repeat, operations, seed=0, scan_repeat=3):
+    workdir = tempfile.mkdtemp(prefix='food_delivery_bench_')
+    try:
+        return _run_benchmarks(workdir, scale, repeat, operations, seed, scan_repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def _run_benchmarks(workdir, scale, repeat, operations, seed, scan_repeat):
+    db_path = os.path.join(workdir, 'food_delivery.db')
+    setup_database(db_path)
+    seed_start = time.perf_counter()
+    user_ids, menu_ids, order_ids = seed_database(db_path, scale, seed)
+    seed_seconds = time.perf_counter() - seed_start
+
+    auth_manager = AuthManager(db_path)
+    menu_manager = MenuManager(db_path)
+    order_manager = OrderManager(db_path)
+    rng = random.Random(seed)
+    num_users = len(user_ids)
+    session_tokens = [auth_manager.login(f"bench_user_{i}", BENCH_PASSWORD).session_token
+                      for i in range(min(num_users, 16))] if 'login_warm' in operations else []
+    benchmarks = {
+        'create_order': lambda i: order_manager.create_order(
+            rng.choice(user_ids), [(rng.choice(menu_ids), 1), (rng.choice(menu_ids), 2)], 'takeaway'),
+        'get_order': lambda i: order_manager.get_order(rng.choice(order_ids)),
+        'get_user_orders': lambda i: order_manager.get_user_orders(rng.choice(user_ids)),
+        'get_all_orders': lambda i: order_manager.get_all_orders(),
+        'get_menu': lambda i: menu_manager.get_menu(),
+        'login': lambda i: auth_manager.login(f"bench_user_{rng.randrange(num_users)}", BENCH_PASSWORD),
+        'login_warm': lambda i: auth_manager.authenticate(rng.choice(session_tokens)),
+    }
+    results = {}
+    for name in operations:
+        results[name] = time_operation(benchmarks[name], scan_repeat if name in FULL_SCAN_OPERATIONS else repeat)
+    return {
+        'scale': scale,
+        'repeat': repeat,
+        'scan_repeat': scan_repeat,
+        'skipped': [name for name in OPERATIONS if name not in operations],
+        'seed_seconds': seed_seconds,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'results': results,
+    }
+
+def compare_results(current, baseline, threshold, metric='median_ms'):
+    regressions = []
+    for name, stats in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        ratio = stats[metric] / base[metric] if base[metric] else float('inf')
+        if ratio > 1 + threshold:
+            regressions.append((name, base[metric], stats[metric], ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the food delivery hot paths.")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='1k')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--scan-repeat', type=int, default=3, help="runs of each full-scan operation")
+    parser.add_argument('--ops', nargs='+', choices=OPERATIONS,
+                        help="operations to run (default: all, minus full scans above %d orders)" % FULL_SCAN_MAX_ORDERS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write JSON results to this file instead of stdout")
+    parser.add_argument('--baseline', help="JSON results of a previous run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed relative slowdown of the median before flagging a regression")
+    args = parser.parse_args(argv)
+
+    operations = args.ops or default_operations(args.scale)
+    results = run_benchmarks(args.scale, args.repeat, operations, args.seed, args.scan_repeat)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('scale') != results['scale']:
+            print(f"Warning: baseline scale {baseline.get('scale')} differs from {results['scale']}", file=sys.stderr)
+        regressions = compare_results(results, baseline, args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before:.3f} ms -> {after:.3f} ms ({ratio:.2f}x)", file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions against baseline.", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
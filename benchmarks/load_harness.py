@@ -0,0 +1,251 @@
+"""Multi-process load generator and replay harness.
+
+Replays a JSONL stream of events through AuthManager, MenuManager and
+OrderManager from a pool of worker processes sharing one database, to
+reproduce lunch-rush contention on the SQLite file. Run from the
+repository root:
+
+    python3 -m benchmarks.load_harness --generate 5000 --events rush.jsonl
+    python3 -m benchmarks.load_harness --events rush.jsonl --workers 8
+
+Each event is a JSON object with a "t" offset in seconds and an "op":
+
+    {"t": 0.0, "op": "register", "username": "u1", "password": "pw"}
+    {"t": 0.1, "op": "login", "username": "u1", "password": "pw"}
+    {"t": 0.2, "op": "order", "username": "u1", "items": [[1, 2]], "delivery_type": "takeaway"}
+    {"t": 0.3, "op": "view", "username": "u1"}
+    {"t": 0.4, "op": "view_all"}
+    {"t": 0.5, "op": "menu"}
+
+Events for the same username always go to the same worker, so a user's
+register/login/order sequence keeps its order. By default the offsets are
+replayed in wall-clock time divided by --time-scale; --virtual-time ignores
+them and replays each worker's events back to back.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+
+from src.food_delivery import (
+    AuthManager,
+    MenuManager,
+    OrderManager,
+    default_shard_paths,
+    setup_database
+)
+
+OPERATIONS = ['register', 'login', 'order', 'view', 'view_all', 'menu']
+
+def generate_events(num_events, num_users, duration, seed=0):
+    rng = random.Random(seed)
+    events = []
+    for i in range(num_users):
+        username = f"load_user_{i}"
+        t = rng.uniform(0, duration * 0.1)
+        events.append({'t': t, 'op': 'register', 'username': username, 'password': 'pw'})
+        events.append({'t': t + 0.01, 'op': 'login', 'username': username, 'password': 'pw'})
+    weights = [('order', 5), ('view', 3), ('menu', 2), ('view_all', 1)]
+    ops = [op for op, weight in weights for _ in range(weight)]
+    for _ in range(max(0, num_events - len(events))):
+        # Lunch rush: offsets cluster around the middle of the run.
+        t = min(duration, max(duration * 0.1, rng.gauss(duration / 2, duration / 6)))
+        op = rng.choice(ops)
+        event = {'t': t, 'op': op}
+        if op != 'view_all' and op != 'menu':
+            event['username'] = f"load_user_{rng.randrange(num_users)}"
+        if op == 'order':
+            event['items'] = [[rng.randint(1, 6), rng.randint(1, 3)] for _ in range(rng.randint(1, 3))]
+            event['delivery_type'] = 'home_delivery' if rng.random() < 0.3 else 'takeaway'
+        events.append(event)
+    events.sort(key=lambda e: e['t'])
+    return events
+
+def load_events(path):
+    events = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                events.append(json.loads(line))
+    events.sort(key=lambda e: e.get('t', 0))
+    return events
+
+def partition_events(events, num_workers):
+    partitions = [[] for _ in range(num_workers)]
+    for i, event in enumerate(events):
+        username = event.get('username')
+        if username is None:
+            index = i % num_workers
+        else:
+            index = zlib.crc32(username.encode()) % num_workers
+        partitions[index].append(event)
+    return partitions
+
+def _classify_error(exc):
+    if isinstance(exc, sqlite3.OperationalError) and 'locked' in str(exc):
+        return 'locked'
+    return type(exc).__name__
+
+def _run_event(event, managers, sessions):
+    auth_manager, menu_manager, order_manager = managers
+    op = event['op']
+    username = event.get('username')
+    if op == 'register':
+        return 'ok' if auth_manager.register_user(username, event.get('password', '')) else 'rejected'
+    if op == 'login':
+        user = auth_manager.login(username, event.get('password', ''))
+        if not user:
+            return 'rejected'
+        sessions[username] = user.user_id
+        return 'ok'
+    if op == 'order':
+        if username not in sessions:
+            return 'no_session'
+        items = [tuple(item) for item in event.get('items', [])]
+        order_id = order_manager.create_order(sessions[username], items, event.get('delivery_type', 'takeaway'))
+        return 'ok' if order_id != -1 else 'rejected'
+    if op == 'view':
+        if username not in sessions:
+            return 'no_session'
+        order_manager.get_user_orders(sessions[username])
+        return 'ok'
+    if op == 'view_all':
+        order_manager.get_all_orders()
+        return 'ok'
+    if op == 'menu':
+        menu_manager.get_menu()
+        return 'ok'
+    return 'unknown_op'
+
+def _worker(args):
+    db_path, shard_paths, events, start_at, time_scale, virtual_time = args
+    # Registration prints on duplicates; keep the worker output quiet.
+    sys.stdout = open(os.devnull, 'w')
+    managers = (AuthManager(db_path), MenuManager(db_path), OrderManager(db_path, shard_paths=shard_paths))
+    sessions = {}
+    records = []
+    for event in events:
+        if not virtual_time:
+            delay = start_at + event.get('t', 0) / time_scale - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        start = time.perf_counter()
+        try:
+            outcome = _run_event(event, managers, sessions)
+        except Exception as exc:
+            outcome = _classify_error(exc)
+        records.append((event['op'], (time.perf_counter() - start) * 1000, outcome))
+    return records
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def summarize(records, elapsed):
+    by_op = {}
+    for op, latency, outcome in records:
+        by_op.setdefault(op, []).append((latency, outcome))
+    operations = {}
+    for op, samples in sorted(by_op.items()):
+        latencies = sorted(latency for latency, _ in samples)
+        outcomes = {}
+        for _, outcome in samples:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        operations[op] = {
+            'count': len(samples),
+            'throughput_per_s': len(samples) / elapsed if elapsed else 0.0,
+            'locked_errors': outcomes.get('locked', 0),
+            'locked_rate': outcomes.get('locked', 0) / len(samples),
+            'outcomes': outcomes,
+            'p50_ms': _percentile(latencies, 0.50),
+            'p95_ms': _percentile(latencies, 0.95),
+            'p99_ms': _percentile(latencies, 0.99),
+            'max_ms': latencies[-1],
+        }
+    locked = sum(1 for _, _, outcome in records if outcome == 'locked')
+    return {
+        'events': len(records),
+        'elapsed_s': elapsed,
+        'throughput_per_s': len(records) / elapsed if elapsed else 0.0,
+        'locked_errors': locked,
+        'locked_rate': locked / len(records) if records else 0.0,
+        'operations': operations,
+    }
+
+def run_load(db_path, events, num_workers, time_scale=1.0, virtual_time=False, shard_paths=None):
+    partitions = partition_events(events, num_workers)
+    # Give every worker time to start before the first event is due.
+    start_at = time.time() + 0.5
+    args = [(db_path, shard_paths, partition, start_at, time_scale, virtual_time) for partition in partitions]
+    with multiprocessing.Pool(num_workers) as pool:
+        started = time.perf_counter()
+        results = pool.map(_worker, args)
+        elapsed = time.perf_counter() - started
+    records = [record for worker_records in results for record in worker_records]
+    summary = summarize(records, elapsed)
+    summary['workers'] = num_workers
+    summary['virtual_time'] = virtual_time
+    summary['time_scale'] = time_scale
+    summary['shards'] = len(shard_paths) if shard_paths else 1
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a JSONL event stream against a shared database.")
+    parser.add_argument('--events', help="JSONL event file to replay (or to write with --generate)")
+    parser.add_argument('--generate', type=int, metavar='N', help="generate N synthetic lunch-rush events")
+    parser.add_argument('--users', type=int, default=200, help="number of users when generating")
+    parser.add_argument('--duration', type=float, default=60.0, help="trace length in seconds when generating")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--db', help="shared database file (default: a temporary one)")
+    parser.add_argument('--shards', type=int, default=1, help="spread orders over this many database files")
+    parser.add_argument('--time-scale', type=float, default=1.0, help="replay speed-up factor for event offsets")
+    parser.add_argument('--virtual-time', action='store_true', help="ignore event offsets and replay back to back")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        events = generate_events(args.generate, args.users, args.duration, args.seed)
+        if args.events:
+            with open(args.events, 'w') as f:
+                for event in events:
+                    f.write(json.dumps(event) + "\n")
+            print(f"Wrote {len(events)} events to {args.events}", file=sys.stderr)
+            return 0
+    elif args.events:
+        events = load_events(args.events)
+    else:
+        parser.error("either --events or --generate is required")
+
+    workdir = None
+    if args.db:
+        db_path = args.db
+    else:
+        workdir = tempfile.mkdtemp(prefix='food_delivery_load_')
+        db_path = os.path.join(workdir, 'food_delivery.db')
+    shard_paths = default_shard_paths(db_path, args.shards) if args.shards > 1 else None
+    try:
+        setup_database(db_path, shard_paths)
+        report = run_load(db_path, events, args.workers, args.time_scale, args.virtual_time, shard_paths)
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
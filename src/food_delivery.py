@@ -1,28 +1,53 @@
+import argparse
+import hashlib
+import hmac
 import os
+import re
 import sqlite3
 import time
 import threading
 import getpass
-from datetime import datetime
+import secrets
+import uuid
+import socket
+import heapq
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
-def setup_database():
-    conn = sqlite3.connect('food_delivery.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY,
-        username TEXT UNIQUE,
-        password TEXT,
-        user_type TEXT
-    )
-    ''')
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS menu (
-        id INTEGER PRIMARY KEY,
-        name TEXT,
-        price REAL
-    )
-    ''')
+def _connect(db_path):
+    # uri=True lets 'file:' URIs through, e.g. shared-cache in-memory databases
+    # for tests, both here and in ATTACH; plain file paths are unaffected.
+    return sqlite3.connect(db_path, uri=True)
+
+PASSWORD_HASH_ITERATIONS = 200000
+
+# Stored as pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>.
+def hash_password(password, iterations=PASSWORD_HASH_ITERATIONS):
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}"
+
+# Returns (matches, needs_upgrade). Rows written before passwords were hashed
+# still hold plaintext; they match by direct comparison and need an upgrade.
+# A missing or malformed stored value never matches.
+def verify_password(password, stored, iterations=PASSWORD_HASH_ITERATIONS):
+    if not stored:
+        return False, False
+    parts = stored.split('$')
+    if parts[0] != 'pbkdf2_sha256':
+        return hmac.compare_digest(stored.encode(), password.encode()), True
+    try:
+        _, stored_iterations, salt, expected = parts
+        stored_iterations = int(stored_iterations)
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), bytes.fromhex(salt), stored_iterations)
+    except (ValueError, OverflowError):
+        return False, False
+    return hmac.compare_digest(digest.hex().encode(), expected.encode()), stored_iterations < iterations
+
+# Order storage tables (orders, their items, lifecycle transitions and search
+# index), created in the primary database and in every shard.
+def _create_order_tables(cursor):
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS orders (
         id INTEGER PRIMARY KEY,
@@ -35,6 +60,7 @@ def setup_database():
         FOREIGN KEY (user_id) REFERENCES users (id)
     )
     ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_order_time ON orders (order_time)")
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS order_items (
         id INTEGER PRIMARY KEY,
@@ -46,12 +72,90 @@ def setup_database():
     )
     ''')
     cursor.execute('''
+    CREATE TABLE IF NOT EXISTS order_transitions (
+        id INTEGER PRIMARY KEY,
+        order_id INTEGER,
+        due_time TEXT,
+        status TEXT,
+        time_remaining INTEGER,
+        release_agent TEXT,
+        applied INTEGER DEFAULT 0,
+        claimed_by TEXT,
+        lease_until TEXT,
+        FOREIGN KEY (order_id) REFERENCES orders (id)
+    )
+    ''')
+    cursor.execute("PRAGMA main.table_info(order_transitions)")
+    columns = [column[1] for column in cursor.fetchall()]
+    for column in ('claimed_by', 'lease_until'):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE order_transitions ADD COLUMN {column} TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_transitions_pending ON order_transitions (applied, due_time)")
+    # Lets the catch-up find each order's own overdue transitions without
+    # rescanning the whole backlog per order.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_transitions_order ON order_transitions (order_id, applied, due_time)")
+    # order_search holds each order's customer username and agent name.
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'order_search'")
+    search_index_exists = cursor.fetchone()[0] > 0
+    cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS order_search USING fts5(username, agent_name)")
+    if not search_index_exists:
+        cursor.execute('''
+        INSERT INTO order_search (rowid, username, agent_name)
+        SELECT o.id, u.username, COALESCE(o.assigned_agent, '') FROM orders o JOIN users u ON o.user_id = u.id
+        ''')
+
+def default_shard_paths(db_path, shard_count):
+    root, ext = os.path.splitext(db_path)
+    return [f"{root}.shard{i}{ext}" for i in range(shard_count)]
+
+def setup_database(db_path='food_delivery.db', shard_paths=None):
+    conn = _connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        username TEXT UNIQUE,
+        password TEXT,
+        user_type TEXT
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS menu (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        price REAL
+    )
+    ''')
+    _create_order_tables(cursor)
+    cursor.execute('''
     CREATE TABLE IF NOT EXISTS delivery_agents (
         id INTEGER PRIMARY KEY,
         name TEXT,
         status TEXT
     )
     ''')
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'menu_fts'")
+    menu_index_exists = cursor.fetchone()[0] > 0
+    # Full-text index on menu names, kept in step with the menu table by triggers.
+    cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS menu_fts USING fts5(name, content='menu', content_rowid='id')")
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS menu_fts_insert AFTER INSERT ON menu BEGIN
+        INSERT INTO menu_fts (rowid, name) VALUES (new.id, new.name);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS menu_fts_delete AFTER DELETE ON menu BEGIN
+        INSERT INTO menu_fts (menu_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS menu_fts_update AFTER UPDATE ON menu BEGIN
+        INSERT INTO menu_fts (menu_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO menu_fts (rowid, name) VALUES (new.id, new.name);
+    END
+    ''')
+    if not menu_index_exists:
+        cursor.execute("INSERT INTO menu_fts (menu_fts) VALUES ('rebuild')")
     cursor.execute("SELECT COUNT(*) FROM menu")
     if cursor.fetchone()[0] == 0:
         menu_items = [
@@ -66,7 +170,7 @@ def setup_database():
     cursor.execute("SELECT COUNT(*) FROM users WHERE user_type = 'manager'")
     if cursor.fetchone()[0] == 0:
         cursor.execute("INSERT INTO users (username, password, user_type) VALUES (?, ?, ?)", 
-                      ('mngr', '123', 'manager'))
+                      ('mngr', hash_password('123'), 'manager'))
     cursor.execute("SELECT COUNT(*) FROM delivery_agents")
     if cursor.fetchone()[0] == 0:
         agents = [
@@ -77,6 +181,56 @@ def setup_database():
         cursor.executemany("INSERT INTO delivery_agents (name, status) VALUES (?, ?)", agents)
     conn.commit()
     conn.close()
+    router = ShardRouter(db_path, shard_paths)
+    for index, shard_path in enumerate(router.shard_paths):
+        if shard_path != db_path:
+            conn = router.connect(index)
+            _create_order_tables(conn.cursor())
+            conn.commit()
+            conn.close()
+    # In WAL mode readers never block the writer: snapshot refreshes and long
+    # scans run alongside order writes, and writes that span the primary and a
+    # shard are not held up by readers of either file. In-memory databases
+    # keep their own journal mode.
+    for path in [db_path] + [path for path in router.shard_paths if path != db_path]:
+        conn = _connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+
+# Routes order storage across several SQLite files. Users, menu and delivery
+# agents stay in the primary database, which every shard connection attaches
+# as primary_db, so the usual unqualified queries work on any shard. Orders,
+# their items and lifecycle transitions go to the shard picked by user id, and
+# their ids are allocated so that id % shard count leads back to the same shard.
+# Transactions that write both databases always write the primary first, so
+# concurrent writers cannot deadlock on each other's locks. In WAL mode SQLite
+# commits each file separately, so a crash mid-commit can leave a delivery
+# agent busy with no order behind it; catch_up_transitions() releases those.
+class ShardRouter:
+    def __init__(self, db_path='food_delivery.db', shard_paths=None):
+        self.db_path = db_path
+        self.shard_paths = list(shard_paths) if shard_paths else [db_path]
+
+    def shard_for_user(self, user_id):
+        return user_id % len(self.shard_paths)
+
+    def shard_for_order(self, order_id):
+        return order_id % len(self.shard_paths)
+
+    def shard_for_transition(self, transition_id):
+        return transition_id % len(self.shard_paths)
+
+    def connect(self, index):
+        shard_path = self.shard_paths[index]
+        conn = _connect(shard_path)
+        if shard_path != self.db_path:
+            conn.execute("ATTACH DATABASE ? AS primary_db", (self.db_path,))
+        return conn
+
+# Turns free text into an FTS5 query that prefix-matches every word.
+def _fts_prefix_query(text):
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"*' for word in words)
 
 class User:
     def __init__(self, user_id, username, user_type):
@@ -107,16 +261,53 @@ class DeliveryAgent:
         self.name = name
         self.status = status
 
+# Bounded cache of verified sessions: an entry expires ttl seconds after it was
+# issued, and the least recently used one is evicted once max_size is reached.
+class SessionCache:
+    def __init__(self, max_size=1024, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, token, user):
+        with self._lock:
+            self._sessions[token] = (user, time.monotonic() + self.ttl)
+            self._sessions.move_to_end(token)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+
+    def get(self, token):
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._sessions[token]
+                return None
+            self._sessions.move_to_end(token)
+            return user
+
+    def remove(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
 class AuthManager:
-    def __init__(self, db_path='food_delivery.db'):
+    def __init__(self, db_path='food_delivery.db', hash_iterations=PASSWORD_HASH_ITERATIONS, sessions=None):
         self.db_path = db_path
+        self.hash_iterations = hash_iterations
+        self.sessions = sessions if sessions is not None else SessionCache()
     
     def register_user(self, username, password, user_type='customer'):
-        conn = sqlite3.connect(self.db_path)
+        conn = _connect(self.db_path)
         cursor = conn.cursor()
         try:
             cursor.execute("INSERT INTO users (username, password, user_type) VALUES (?, ?, ?)", 
-                          (username, password, user_type))
+                          (username, hash_password(password, self.hash_iterations), user_type))
             conn.commit()
             return True
         except sqlite3.IntegrityError:
@@ -125,35 +316,124 @@ class AuthManager:
         finally:
             conn.close()
     
+    # Verifies the password (the slow path) and issues a session token that
+    # authenticate() checks later without hashing again.
     def login(self, username, password):
-        conn = sqlite3.connect(self.db_path)
+        conn = _connect(self.db_path)
         cursor = conn.cursor()
-        cursor.execute("SELECT id, username, user_type FROM users WHERE username = ? AND password = ?", 
-                      (username, password))
+        cursor.execute("SELECT id, username, user_type, password FROM users WHERE username = ?", (username,))
         user_data = cursor.fetchone()
+        if not user_data:
+            conn.close()
+            # Hash anyway so unknown usernames take as long as wrong passwords.
+            hash_password(password, self.hash_iterations)
+            return None
+        matches, needs_upgrade = verify_password(password, user_data[3], self.hash_iterations)
+        if matches and needs_upgrade:
+            cursor.execute("UPDATE users SET password = ? WHERE id = ? AND password = ?",
+                          (hash_password(password, self.hash_iterations), user_data[0], user_data[3]))
+            conn.commit()
         conn.close()
-        if user_data:
-            return User(user_data[0], user_data[1], user_data[2])
-        return None
+        if not matches:
+            return None
+        user = User(user_data[0], user_data[1], user_data[2])
+        user.session_token = secrets.token_urlsafe(32)
+        self.sessions.put(user.session_token, user)
+        return user
+
+    def authenticate(self, session_token):
+        return self.sessions.get(session_token)
+
+    def logout(self, session_token):
+        self.sessions.remove(session_token)
 
 class MenuManager:
     def __init__(self, db_path='food_delivery.db'):
         self.db_path = db_path
     
     def get_menu(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = _connect(self.db_path)
         cursor = conn.cursor()
         cursor.execute("SELECT id, name, price FROM menu")
         menu_items = [MenuItem(item[0], item[1], item[2]) for item in cursor.fetchall()]
         conn.close()
         return menu_items
 
+    def search_menu(self, query, limit=20):
+        match = _fts_prefix_query(query)
+        if not match:
+            return []
+        conn = _connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT m.id, m.name, m.price
+            FROM menu_fts JOIN menu m ON m.id = menu_fts.rowid
+            WHERE menu_fts MATCH ?
+            ORDER BY rank LIMIT ?
+        """, (match, limit))
+        menu_items = [MenuItem(item[0], item[1], item[2]) for item in cursor.fetchall()]
+        conn.close()
+        return menu_items
+
+# Runs due order transitions from a single daemon thread, earliest first. A
+# transition that fails (usually "database is locked" under load) is retried
+# with exponential backoff, capped at max_retry_delay seconds.
+class LifecycleScheduler:
+    def __init__(self, callback, retry_delay=0.5, max_retry_delay=30.0):
+        self.callback = callback
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._queue = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, transition_id, due_at, attempt=0):
+        with self._condition:
+            heapq.heappush(self._queue, (due_at, transition_id, attempt))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue or self._queue[0][0] > time.time():
+                    timeout = self._queue[0][0] - time.time() if self._queue else None
+                    self._condition.wait(timeout)
+                _, transition_id, attempt = heapq.heappop(self._queue)
+            try:
+                self.callback(transition_id)
+            except Exception:
+                # Any failure leaves the transition pending in the table; try it again later.
+                delay = min(self.retry_delay * 2 ** attempt, self.max_retry_delay)
+                with self._condition:
+                    heapq.heappush(self._queue, (time.time() + delay, transition_id, attempt + 1))
+
+def _lifecycle_transitions(delivery_type, assigned_agent):
+    # (minutes after order_time, status, time_remaining, agent to release)
+    if delivery_type == 'home_delivery':
+        # For home delivery: preparing (0-1 min) -> out for delivery (1-3 min) -> done (after 3 min)
+        return [
+            (1, 'out for delivery', 2, None),
+            (2, 'out for delivery', 1, None),
+            (3, 'done', 0, assigned_agent),
+        ]
+    # For takeaway: preparing (0-1 min) -> done (after 1 min)
+    return [(1, 'done', 0, None)]
+
 class OrderManager:
-    def __init__(self, db_path='food_delivery.db'):
+    # With run_lifecycle=False orders only enqueue their transitions and a
+    # separate LifecycleWorker process applies them.
+    def __init__(self, db_path='food_delivery.db', run_lifecycle=True, shard_paths=None):
         self.db_path = db_path
+        self.run_lifecycle = run_lifecycle
+        self.router = ShardRouter(db_path, shard_paths)
+        self.scheduler = LifecycleScheduler(self.apply_transition)
         
     def create_order(self, user_id, order_items, delivery_type):
-        conn = sqlite3.connect(self.db_path)
+        shard = self.router.shard_for_user(user_id)
+        conn = self.router.connect(shard)
         cursor = conn.cursor()
         time_remaining = 3 if delivery_type == 'home_delivery' else 1
         if delivery_type == 'home_delivery':
@@ -166,49 +446,150 @@ class OrderManager:
             cursor.execute("UPDATE delivery_agents SET status = 'busy' WHERE id = ?", (agent[0],))
         else:
             assigned_agent = None
-        order_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        now = datetime.now()
+        order_time = now.strftime("%Y-%m-%d %H:%M:%S")
+        # Ids step by the shard count, so every id in this shard is congruent to its index.
+        shard_count = len(self.router.shard_paths)
         cursor.execute("""
-            INSERT INTO orders (user_id, order_time, delivery_type, status, assigned_agent, time_remaining) 
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (user_id, order_time, delivery_type, 'preparing', assigned_agent, time_remaining))
+            INSERT INTO orders (id, user_id, order_time, delivery_type, status, assigned_agent, time_remaining) 
+            VALUES ((SELECT COALESCE(MAX(id), ?) + ? FROM orders), ?, ?, ?, ?, ?, ?)
+        """, (shard, shard_count, user_id, order_time, delivery_type, 'preparing', assigned_agent, time_remaining))
         order_id = cursor.lastrowid
         for item_id, quantity in order_items:
             cursor.execute("INSERT INTO order_items (order_id, menu_item_id, quantity) VALUES (?, ?, ?)",
                           (order_id, item_id, quantity))
+        cursor.execute("""
+            INSERT INTO order_search (rowid, username, agent_name)
+            SELECT ?, username, ? FROM users WHERE id = ?
+        """, (order_id, assigned_agent or '', user_id))
+        transitions = []
+        for minutes, status, remaining, release_agent in _lifecycle_transitions(delivery_type, assigned_agent):
+            due = now + timedelta(minutes=minutes)
+            cursor.execute("""
+                INSERT INTO order_transitions (id, order_id, due_time, status, time_remaining, release_agent)
+                VALUES ((SELECT COALESCE(MAX(id), ?) + ? FROM order_transitions), ?, ?, ?, ?, ?)
+            """, (shard, shard_count, order_id, due.strftime("%Y-%m-%d %H:%M:%S"), status, remaining, release_agent))
+            transitions.append((cursor.lastrowid, due.timestamp()))
         conn.commit()
-        threading.Thread(target=self._handle_order_lifecycle, args=(order_id, delivery_type, assigned_agent), daemon=True).start()
         conn.close()
+        if self.run_lifecycle:
+            for transition_id, due_at in transitions:
+                self.scheduler.schedule(transition_id, due_at)
         return order_id
-    
-    def _handle_order_lifecycle(self, order_id, delivery_type, assigned_agent):
-        if delivery_type == 'home_delivery':
-            # For home delivery: preparing (0-1 min) -> out for delivery (1-3 min) -> done (after 3 min)
-            time.sleep(60)
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("UPDATE orders SET status = 'out for delivery', time_remaining = 2 WHERE id = ?", (order_id,))
-            conn.commit()
+
+    def apply_transition(self, transition_id):
+        conn = self.router.connect(self.router.shard_for_transition(transition_id))
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT order_id, due_time, status, time_remaining, release_agent, applied
+            FROM order_transitions WHERE id = ?
+        """, (transition_id,))
+        row = cursor.fetchone()
+        if not row or row[5]:
+            conn.close()
+            return
+        order_id, due_time, status, time_remaining, release_agent, _ = row
+        if release_agent:
+            cursor.execute("UPDATE delivery_agents SET status = 'available' WHERE name = ?", (release_agent,))
+        # Claiming the row makes a transition apply exactly once, whoever gets to it.
+        cursor.execute("UPDATE order_transitions SET applied = 1 WHERE id = ? AND applied = 0", (transition_id,))
+        if cursor.rowcount == 0:
+            conn.rollback()
             conn.close()
-            time.sleep(60)
-            conn = sqlite3.connect(self.db_path)
+            return
+        cursor.execute("""
+            UPDATE orders SET status = ?, time_remaining = ?
+            WHERE id = ? AND NOT EXISTS (
+                SELECT 1 FROM order_transitions
+                WHERE order_id = ? AND applied = 1 AND due_time > ?
+            )
+        """, (status, time_remaining, order_id, order_id, due_time))
+        conn.commit()
+        conn.close()
+
+    # Applies every overdue transition in one batch and returns how many
+    # were caught up.
+    def catch_up_transitions(self):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        recovered = 0
+        for shard in range(len(self.router.shard_paths)):
+            conn = self.router.connect(shard)
             cursor = conn.cursor()
-            cursor.execute("UPDATE orders SET time_remaining = 1 WHERE id = ?", (order_id,))
+            cursor.execute("""
+                UPDATE delivery_agents SET status = 'available'
+                WHERE name IN (
+                    SELECT release_agent FROM order_transitions
+                    WHERE applied = 0 AND due_time <= ? AND release_agent IS NOT NULL
+                )
+            """, (now,))
+            # Each order jumps straight to its latest overdue state, unless a later
+            # transition was already applied; its stale ones are still marked applied below.
+            cursor.execute("""
+                UPDATE orders SET (status, time_remaining) = (
+                    SELECT t.status, t.time_remaining FROM order_transitions t
+                    WHERE t.order_id = orders.id AND t.applied = 0 AND t.due_time <= ?
+                    ORDER BY t.due_time DESC, t.id DESC LIMIT 1
+                )
+                WHERE id IN (SELECT order_id FROM order_transitions WHERE applied = 0 AND due_time <= ?)
+                AND NOT EXISTS (
+                    SELECT 1 FROM order_transitions later
+                    WHERE later.order_id = orders.id AND later.applied = 1 AND later.due_time > (
+                        SELECT MAX(t.due_time) FROM order_transitions t
+                        WHERE t.order_id = orders.id AND t.applied = 0 AND t.due_time <= ?
+                    )
+                )
+            """, (now, now, now))
+            cursor.execute("UPDATE order_transitions SET applied = 1 WHERE applied = 0 AND due_time <= ?", (now,))
+            recovered += cursor.rowcount
             conn.commit()
             conn.close()
-            time.sleep(60)
-        else:
-            # For takeaway: preparing (0-1 min) -> done (after 1 min)
-            time.sleep(60)
-        conn = sqlite3.connect(self.db_path)
+        self.release_orphaned_agents()
+        return recovered
+
+    # Frees busy agents that no pending transition in any shard will release,
+    # left behind by a crash between the two commits of a sharded write. The
+    # primary's write lock is held throughout, so a create_order in progress
+    # cannot be caught between its shard commit and its primary commit.
+    def release_orphaned_agents(self):
+        conn = _connect(self.db_path)
         cursor = conn.cursor()
-        cursor.execute("UPDATE orders SET status = 'done', time_remaining = 0 WHERE id = ?", (order_id,))
-        if delivery_type == 'home_delivery' and assigned_agent:
-            cursor.execute("UPDATE delivery_agents SET status = 'available' WHERE name = ?", (assigned_agent,))
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT id, name FROM delivery_agents WHERE status = 'busy'")
+        busy_agents = cursor.fetchall()
+        pending_releases = set()
+        if busy_agents:
+            for shard_path in self.router.shard_paths:
+                shard_conn = _connect(shard_path)
+                shard_cursor = shard_conn.cursor()
+                shard_cursor.execute("""
+                    SELECT DISTINCT release_agent FROM order_transitions
+                    WHERE applied = 0 AND release_agent IS NOT NULL
+                """)
+                pending_releases.update(row[0] for row in shard_cursor.fetchall())
+                shard_conn.close()
+        orphaned = [(agent_id,) for agent_id, name in busy_agents if name not in pending_releases]
+        cursor.executemany("UPDATE delivery_agents SET status = 'available' WHERE id = ?", orphaned)
         conn.commit()
         conn.close()
+        return len(orphaned)
+
+    # Catches up overdue transitions, hands the rest to the scheduler and
+    # returns how many overdue transitions were caught up.
+    def recover_transitions(self):
+        recovered = self.catch_up_transitions()
+        pending = []
+        for shard in range(len(self.router.shard_paths)):
+            conn = self.router.connect(shard)
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, due_time FROM order_transitions WHERE applied = 0")
+            pending.extend(cursor.fetchall())
+            conn.close()
+        for transition_id, due_time in pending:
+            self.scheduler.schedule(transition_id, datetime.strptime(due_time, "%Y-%m-%d %H:%M:%S").timestamp())
+        return recovered
     
     def get_order(self, order_id):
-        conn = sqlite3.connect(self.db_path)
+        conn = self.router.connect(self.router.shard_for_order(order_id))
         cursor = conn.cursor()
         cursor.execute("""
             SELECT id, user_id, order_time, delivery_type, status, assigned_agent, time_remaining 
@@ -232,7 +613,7 @@ class OrderManager:
         return order
     
     def get_user_orders(self, user_id):
-        conn = sqlite3.connect(self.db_path)
+        conn = self.router.connect(self.router.shard_for_user(user_id))
         cursor = conn.cursor()
         cursor.execute("""
             SELECT id, user_id, order_time, delivery_type, status, assigned_agent, time_remaining 
@@ -254,8 +635,21 @@ class OrderManager:
         conn.close()
         return orders
     
+    # Runs func(shard_index) for every shard, in parallel threads when sharded.
+    def _map_shards(self, func):
+        shard_count = len(self.router.shard_paths)
+        if shard_count == 1:
+            return [func(0)]
+        with ThreadPoolExecutor(max_workers=shard_count) as pool:
+            return list(pool.map(func, range(shard_count)))
+
     def get_all_orders(self):
-        conn = sqlite3.connect(self.db_path)
+        # Every shard returns its orders newest first, so a k-way merge keeps the global order.
+        shard_orders = self._map_shards(self._get_shard_orders)
+        return list(heapq.merge(*shard_orders, key=lambda order: order.order_time, reverse=True))
+
+    def _get_shard_orders(self, shard):
+        conn = self.router.connect(shard)
         cursor = conn.cursor()
         cursor.execute("""
             SELECT o.id, o.user_id, o.order_time, o.delivery_type, o.status, o.assigned_agent, o.time_remaining, u.username
@@ -280,25 +674,217 @@ class OrderManager:
         conn.close()
         return orders
 
+    # Unsharded, returns the best-ranked matches. bm25 ranks come from each
+    # shard's own index and are not comparable across shards, so sharded
+    # searches return the newest matches instead, merged like get_all_orders().
+    def search_orders(self, query, limit=20):
+        match = _fts_prefix_query(query)
+        if not match:
+            return []
+        if len(self.router.shard_paths) == 1:
+            return self._search_shard_orders(0, match, limit, by_rank=True)
+        shard_orders = self._map_shards(lambda shard: self._search_shard_orders(shard, match, limit, by_rank=False))
+        return list(heapq.merge(*shard_orders, key=lambda order: order.order_time, reverse=True))[:limit]
+
+    def _search_shard_orders(self, shard, match, limit, by_rank):
+        order_by = "s.rank, o.order_time DESC" if by_rank else "o.order_time DESC, o.id DESC"
+        conn = self.router.connect(shard)
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT o.id, o.user_id, o.order_time, o.delivery_type, o.status, o.assigned_agent, o.time_remaining, u.username
+            FROM order_search s
+            JOIN orders o ON o.id = s.rowid
+            JOIN users u ON o.user_id = u.id
+            WHERE order_search MATCH ?
+            ORDER BY {order_by} LIMIT ?
+        """, (match, limit))
+        orders = []
+        for order_data in cursor.fetchall():
+            order = Order(order_data[0], order_data[1], order_data[2], order_data[3], 
+                          order_data[4], order_data[5], order_data[6])
+            order.username = order_data[7]
+            cursor.execute("""
+                SELECT oi.menu_item_id, oi.quantity, m.name, m.price
+                FROM order_items oi
+                JOIN menu m ON oi.menu_item_id = m.id
+                WHERE oi.order_id = ?
+            """, (order.order_id,))
+            items = cursor.fetchall()
+            order.items = [(item[0], item[1], item[2], item[3]) for item in items]
+            orders.append(order)
+        conn.close()
+        return orders
+
+# Standalone lifecycle worker: claims due transitions from the database under
+# a lease, so several worker processes can share one database and a crashed
+# worker's claims are picked up again once its lease runs out.
+class LifecycleWorker:
+    def __init__(self, db_path='food_delivery.db', worker_id=None, lease_seconds=30, batch_size=100, poll_interval=1.0,
+                 shard_paths=None):
+        self.db_path = db_path
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.order_manager = OrderManager(db_path, run_lifecycle=False, shard_paths=shard_paths)
+
+    def claim_due_transitions(self):
+        now = datetime.now()
+        now_text = now.strftime("%Y-%m-%d %H:%M:%S")
+        lease_until = (now + timedelta(seconds=self.lease_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+        router = self.order_manager.router
+        claimed = []
+        for shard in range(len(router.shard_paths)):
+            if len(claimed) >= self.batch_size:
+                break
+            conn = router.connect(shard)
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE order_transitions SET claimed_by = ?, lease_until = ?
+                WHERE id IN (
+                    SELECT id FROM order_transitions
+                    WHERE applied = 0 AND due_time <= ? AND (lease_until IS NULL OR lease_until < ?)
+                    ORDER BY due_time, id LIMIT ?
+                )
+            """, (self.worker_id, lease_until, now_text, now_text, self.batch_size - len(claimed)))
+            conn.commit()
+            cursor.execute("""
+                SELECT id FROM order_transitions
+                WHERE applied = 0 AND claimed_by = ? AND lease_until = ?
+                ORDER BY due_time, id
+            """, (self.worker_id, lease_until))
+            claimed.extend(row[0] for row in cursor.fetchall())
+            conn.close()
+        return claimed
+
+    def run_once(self):
+        claimed = self.claim_due_transitions()
+        for transition_id in claimed:
+            self.order_manager.apply_transition(transition_id)
+        return len(claimed)
+
+    def run(self):
+        caught_up = False
+        while True:
+            try:
+                if not caught_up:
+                    self.order_manager.catch_up_transitions()
+                    caught_up = True
+                if self.run_once() < self.batch_size:
+                    time.sleep(self.poll_interval)
+            except sqlite3.OperationalError:
+                # Another process holds the write lock; try again next round.
+                time.sleep(self.poll_interval)
+
 class DeliveryAgentManager:
     def __init__(self, db_path='food_delivery.db'):
         self.db_path = db_path
     
     def get_all_agents(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = _connect(self.db_path)
         cursor = conn.cursor()
         cursor.execute("SELECT id, name, status FROM delivery_agents")
         agents = [DeliveryAgent(agent[0], agent[1], agent[2]) for agent in cursor.fetchall()]
         conn.close()
         return agents
 
+# Tables the manager dashboards read and the columns copied from each; password
+# hashes and the menu search index stay out of the snapshot.
+SNAPSHOT_PRIMARY_TABLES = [
+    ('users', 'id, username, user_type'),
+    ('menu', 'id, name, price'),
+    ('delivery_agents', 'id, name, status'),
+]
+SNAPSHOT_ORDER_TABLES = [
+    ('orders', 'id, user_id, order_time, delivery_type, status, assigned_agent, time_remaining'),
+    ('order_items', 'id, order_id, menu_item_id, quantity'),
+    ('order_search', 'rowid, username, agent_name'),
+]
+
+# In-memory copy of the dashboard tables of the primary database and its
+# shards, refreshed once it is older than max_staleness seconds. Long manager
+# scans read the copy instead of the live database. Each file is copied in one
+# read transaction, which in WAL mode does not block order writers. The files
+# are copied one after another, so the copy is not one point-in-time view across
+# them; shards are copied before the primary, so every copied order's customer
+# (registered before the order was placed) is in the copied users table.
+class ReadSnapshot:
+    def __init__(self, db_path='food_delivery.db', shard_paths=None, max_staleness=5.0):
+        self.max_staleness = max_staleness
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+        name = f"snapshot_{uuid.uuid4().hex}"
+        router = ShardRouter(db_path, shard_paths)
+        shard_sources = [path for path in router.shard_paths if path != db_path]
+        copies = {db_path: f"file:{name}?mode=memory&cache=shared"}
+        for i, path in enumerate(shard_sources):
+            copies[path] = f"file:{name}_shard{i}?mode=memory&cache=shared"
+        self.db_path = copies[db_path]
+        self.shard_paths = [copies[path] for path in shard_paths] if shard_paths else None
+        primary_tables = SNAPSHOT_PRIMARY_TABLES + (SNAPSHOT_ORDER_TABLES if not shard_sources else [])
+        self._sources = [(path, copies[path], SNAPSHOT_ORDER_TABLES) for path in shard_sources]
+        self._sources.append((db_path, self.db_path, primary_tables))
+        # A shared-cache in-memory database only lives while a connection to it is open.
+        self._copies = [_connect(copy) for copy in copies.values()]
+        self._create_tables()
+
+    def _create_tables(self):
+        conn = _connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, user_type TEXT)")
+        cursor.execute("CREATE TABLE menu (id INTEGER PRIMARY KEY, name TEXT, price REAL)")
+        cursor.execute("CREATE TABLE delivery_agents (id INTEGER PRIMARY KEY, name TEXT, status TEXT)")
+        if not self.shard_paths:
+            _create_order_tables(cursor)
+        conn.commit()
+        conn.close()
+        router = ShardRouter(self.db_path, self.shard_paths)
+        for index, shard_path in enumerate(router.shard_paths):
+            if shard_path != self.db_path:
+                conn = router.connect(index)
+                _create_order_tables(conn.cursor())
+                conn.commit()
+                conn.close()
+
+    def refresh(self, force=False):
+        with self._lock:
+            if not force and self.refreshed_at is not None and time.monotonic() - self.refreshed_at <= self.max_staleness:
+                return False
+            for source_path, copy_path, tables in self._sources:
+                source = _connect(source_path)
+                source.execute("ATTACH DATABASE ? AS snapshot", (copy_path,))
+                for table, columns in tables:
+                    source.execute(f"DELETE FROM snapshot.{table}")
+                    source.execute(f"INSERT INTO snapshot.{table} ({columns}) SELECT {columns} FROM main.{table}")
+                source.commit()
+                source.close()
+            self.refreshed_at = time.monotonic()
+            return True
+
+    def close(self):
+        for copy in self._copies:
+            copy.close()
+
 class FoodDeliveryApp:
-    def __init__(self):
-        setup_database()
-        self.auth_manager = AuthManager()
-        self.menu_manager = MenuManager()
-        self.order_manager = OrderManager()
-        self.agent_manager = DeliveryAgentManager()
+    # Manager dashboards read from a snapshot at most snapshot_staleness seconds
+    # old; None reads them straight from the live database.
+    def __init__(self, db_path='food_delivery.db', run_lifecycle=True, shard_paths=None, snapshot_staleness=5.0):
+        setup_database(db_path, shard_paths)
+        self.db_path = db_path
+        self.auth_manager = AuthManager(db_path)
+        self.menu_manager = MenuManager(db_path)
+        self.order_manager = OrderManager(db_path, run_lifecycle, shard_paths)
+        self.agent_manager = DeliveryAgentManager(db_path)
+        if snapshot_staleness is None:
+            self.read_snapshot = None
+            self.report_order_manager = self.order_manager
+            self.report_agent_manager = self.agent_manager
+        else:
+            self.read_snapshot = ReadSnapshot(db_path, shard_paths, snapshot_staleness)
+            self.report_order_manager = OrderManager(self.read_snapshot.db_path, False, self.read_snapshot.shard_paths)
+            self.report_agent_manager = DeliveryAgentManager(self.read_snapshot.db_path)
+        if run_lifecycle:
+            self.order_manager.recover_transitions()
         self.current_user = None
     
     def start(self):
@@ -309,6 +895,9 @@ class FoodDeliveryApp:
         while True:
             if not self.current_user:
                 self.show_auth_menu()
+            elif not self.auth_manager.authenticate(self.current_user.session_token):
+                self.current_user = None
+                print("Your session has expired. Please log in again.")
             elif self.current_user.user_type == 'customer':
                 self.show_customer_menu()
             elif self.current_user.user_type == 'manager':
@@ -341,6 +930,11 @@ class FoodDeliveryApp:
         else:
             print("Invalid username or password.")
     
+    def logout(self):
+        self.auth_manager.logout(self.current_user.session_token)
+        self.current_user = None
+        print("Logged out successfully.")
+
     def register(self):
         username = input("Enter username: ")
         password = getpass.getpass("Enter password: ")
@@ -364,6 +958,22 @@ class FoodDeliveryApp:
             print(f"{item.item_id:<5}{item.name:<20}${item.price:<10.2f}")
         print("=" * 40)
         input("\nPress Enter to continue...")
+
+    def search_menu(self):
+        query = input("Search menu for: ")
+        menu_items = self.menu_manager.search_menu(query)
+        os.system('cls' if os.name == 'nt' else 'clear')
+        print(f"\nMenu items matching '{query}':")
+        print("=" * 40)
+        if not menu_items:
+            print("No matching items found.")
+        else:
+            print(f"{'ID':<5}{'Name':<20}{'Price':<10}")
+            print("-" * 40)
+            for item in menu_items:
+                print(f"{item.item_id:<5}{item.name:<20}${item.price:<10.2f}")
+        print("=" * 40)
+        input("\nPress Enter to continue...")
     
     def show_customer_menu(self):
         os.system('cls' if os.name == 'nt' else 'clear')
@@ -372,8 +982,9 @@ class FoodDeliveryApp:
         print("1. View Menu")
         print("2. Place Order")
         print("3. View My Orders")
-        print("4. Logout")
-        choice = input("Enter your choice (1-4): ")
+        print("4. Search Menu")
+        print("5. Logout")
+        choice = input("Enter your choice (1-5): ")
         if choice == '1':
             self.view_menu()
         elif choice == '2':
@@ -381,8 +992,9 @@ class FoodDeliveryApp:
         elif choice == '3':
             self.view_my_orders()
         elif choice == '4':
-            self.current_user = None
-            print("Logged out successfully.")
+            self.search_menu()
+        elif choice == '5':
+            self.logout()
         else:
             print("Invalid choice. Please try again.")
     
@@ -502,8 +1114,9 @@ class FoodDeliveryApp:
         print("1. View All Orders")
         print("2. View All Delivery Agents")
         print("3. View Menu")
-        print("4. Logout")
-        choice = input("Enter your choice (1-4): ")
+        print("4. Search Orders")
+        print("5. Logout")
+        choice = input("Enter your choice (1-5): ")
         if choice == '1':
             self.view_all_orders()
         elif choice == '2':
@@ -511,14 +1124,20 @@ class FoodDeliveryApp:
         elif choice == '3':
             self.view_menu()
         elif choice == '4':
-            self.current_user = None
-            print("Logged out successfully.")
+            self.search_orders()
+        elif choice == '5':
+            self.logout()
         else:
             print("Invalid choice. Please try again.")
     
+    def refresh_snapshot(self):
+        if self.read_snapshot:
+            self.read_snapshot.refresh()
+
     def view_all_orders(self):
         while True:
-            orders = self.order_manager.get_all_orders()
+            self.refresh_snapshot()
+            orders = self.report_order_manager.get_all_orders()
             os.system('cls' if os.name == 'nt' else 'clear')
             print("\nAll Orders:")
             if not orders:
@@ -542,9 +1161,38 @@ class FoodDeliveryApp:
                 print("Please enter a valid number.")
                 time.sleep(1)
     
+    def search_orders(self):
+        query = input("Search orders by customer or delivery agent: ")
+        while True:
+            self.refresh_snapshot()
+            orders = self.report_order_manager.search_orders(query)
+            os.system('cls' if os.name == 'nt' else 'clear')
+            print(f"\nOrders matching '{query}':")
+            if not orders:
+                print("No matching orders found.")
+            else:
+                for i, order in enumerate(orders):
+                    delivery_type = "Home Delivery" if order.delivery_type == 'home_delivery' else "Takeaway"
+                    print(f"{i+1}. Order #{order.order_id} - User: {order.username} - {order.order_time} - {delivery_type} - Status: {order.status}")
+            print("\n0. Back to Menu")
+            choice = input("Enter order number to view details (or 0 to go back): ")
+            try:
+                if choice == '0':
+                    break
+                idx = int(choice) - 1
+                if 0 <= idx < len(orders):
+                    self.show_order_details(orders[idx])
+                else:
+                    print("Invalid choice.")
+                    time.sleep(1)
+            except ValueError:
+                print("Please enter a valid number.")
+                time.sleep(1)
+    
     def view_all_agents(self):
         while True:
-            agents = self.agent_manager.get_all_agents()
+            self.refresh_snapshot()
+            agents = self.report_agent_manager.get_all_agents()
             os.system('cls' if os.name == 'nt' else 'clear')
             print("\nAll Delivery Agents:")
             for agent in agents:
@@ -555,5 +1203,25 @@ class FoodDeliveryApp:
                 break
 
 if __name__ == "__main__":
-    app = FoodDeliveryApp()
-    app.start()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Food Delivery System")
+    parser.add_argument('--db', default='food_delivery.db', help="path to the SQLite database file")
+    parser.add_argument('--worker', action='store_true', help="run as a lifecycle worker instead of the CLI")
+    parser.add_argument('--worker-id', help="name used for the worker's leases (default: host and pid)")
+    parser.add_argument('--external-worker', action='store_true',
+                        help="only enqueue lifecycle transitions and leave them to --worker processes")
+    parser.add_argument('--snapshot-staleness', type=float, default=5.0,
+                        help="seconds a manager dashboard may lag behind live orders")
+    parser.add_argument('--no-snapshot', action='store_true', help="read manager dashboards from the live database")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="spread orders over this many database files next to --db (keep it fixed once chosen)")
+    args = parser.parse_args()
+    shard_paths = default_shard_paths(args.db, args.shards) if args.shards > 1 else None
+    if args.worker:
+        setup_database(args.db, shard_paths)
+        worker = LifecycleWorker(args.db, args.worker_id, shard_paths=shard_paths)
+        print(f"Lifecycle worker {worker.worker_id} running on {args.db}")
+        worker.run()
+    else:
+        app = FoodDeliveryApp(args.db, run_lifecycle=not args.external_worker, shard_paths=shard_paths,
+                              snapshot_staleness=None if args.no_snapshot else args.snapshot_staleness)
+        app.start()
\ No newline at end of file
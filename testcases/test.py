@@ -4,25 +4,55 @@ from src.food_delivery import (
     MenuManager,
     OrderManager,
     DeliveryAgentManager,
+    LifecycleScheduler,
+    LifecycleWorker,
+    ReadSnapshot,
+    SessionCache,
+    ShardRouter,
     setup_database,
     FoodDeliveryApp
 )
+import os
+import shutil
 import sqlite3
+import tempfile
 import uuid
 import time
 import io
 from unittest.mock import patch
 
+def make_temp_database(shard_count=0):
+    # Each test process gets its own directory, so parallel workers never share a file.
+    worker = os.environ.get('PYTEST_XDIST_WORKER', str(os.getpid()))
+    tmp_dir = tempfile.mkdtemp(prefix=f"food_delivery_test_{worker}_")
+    db_path = os.path.join(tmp_dir, 'food_delivery.db')
+    shard_paths = [os.path.join(tmp_dir, f'shard{i}.db') for i in range(shard_count)] or None
+    setup_database(db_path, shard_paths)
+    return db_path, shard_paths, lambda: shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def make_memory_database(shard_count=0):
+    # A shared-cache in-memory database lives as long as one connection to it
+    # stays open, so keep one around per database until cleanup.
+    name = f"food_delivery_{uuid.uuid4().hex}"
+    db_path = f"file:{name}?mode=memory&cache=shared"
+    shard_paths = [f"file:{name}_shard{i}?mode=memory&cache=shared" for i in range(shard_count)] or None
+    keepers = [sqlite3.connect(path, uri=True) for path in [db_path] + (shard_paths or [])]
+    setup_database(db_path, shard_paths)
+    return db_path, shard_paths, lambda: [keeper.close() for keeper in keepers]
+
 class TestFoodDeliverySystem(unittest.TestCase):
+    make_database = staticmethod(make_temp_database)
+    shard_count = 0
 
     @classmethod
     def setUpClass(cls):
-        print("Setting up TestFoodDeliverySystem")
-        setup_database()
-        cls.auth_manager = AuthManager()
-        cls.menu_manager = MenuManager()
-        cls.order_manager = OrderManager()
-        cls.agent_manager = DeliveryAgentManager()
+        print(f"Setting up {cls.__name__}")
+        cls.db_path, cls.shard_paths, cls.cleanup_database = cls.make_database(cls.shard_count)
+        # Few hash iterations keep the many logins in this suite fast.
+        cls.auth_manager = AuthManager(cls.db_path, hash_iterations=1000)
+        cls.menu_manager = MenuManager(cls.db_path)
+        cls.order_manager = OrderManager(cls.db_path, shard_paths=cls.shard_paths)
+        cls.agent_manager = DeliveryAgentManager(cls.db_path)
         existing_user = cls.auth_manager.login("valid_user", "password123")
         if not existing_user:
             cls.auth_manager.register_user("valid_user", "password123")
@@ -30,9 +60,20 @@ class TestFoodDeliverySystem(unittest.TestCase):
         if not existing_manager:
             cls.auth_manager.register_user("manager_user", "adminpass", "manager")
 
+    @classmethod
+    def tearDownClass(cls):
+        cls.cleanup_database()
+
+    def connect(self):
+        return sqlite3.connect(self.db_path, uri=True)
+
+    def connect_order_shard(self, order_id):
+        router = ShardRouter(self.db_path, self.shard_paths)
+        return router.connect(router.shard_for_order(order_id))
+
     def setUp(self):
         print("Resetting delivery agents to available")
-        conn = sqlite3.connect('food_delivery.db')
+        conn = self.connect()
         cursor = conn.cursor()
         cursor.execute("UPDATE delivery_agents SET status = 'available'")
         conn.commit()
@@ -83,7 +124,7 @@ class TestFoodDeliverySystem(unittest.TestCase):
     
     def test_place_order_no_available_agent(self):
         print("Running test_place_order_no_available_agent")
-        conn = sqlite3.connect('food_delivery.db')
+        conn = self.connect()
         cursor = conn.cursor()
         cursor.execute("UPDATE delivery_agents SET status = 'busy'")
         conn.commit()
@@ -267,7 +308,7 @@ class TestFoodDeliverySystem(unittest.TestCase):
     
     def test_view_menu_output(self):
         print("Running test_view_menu_output")
-        app = FoodDeliveryApp()
+        app = FoodDeliveryApp(self.db_path, shard_paths=self.shard_paths)
         with patch('builtins.input', return_value=''):
             captured_output = io.StringIO()
             with patch('sys.stdout', new=captured_output):
@@ -277,7 +318,7 @@ class TestFoodDeliverySystem(unittest.TestCase):
     
     def test_show_customer_menu_view_menu(self):
         print("Running test_show_customer_menu_view_menu")
-        app = FoodDeliveryApp()
+        app = FoodDeliveryApp(self.db_path, shard_paths=self.shard_paths)
         class DummyUser:
             username = "dummy_customer"
             user_id = 1
@@ -291,7 +332,7 @@ class TestFoodDeliverySystem(unittest.TestCase):
     
     def test_show_manager_menu_view_menu(self):
         print("Running test_show_manager_menu_view_menu")
-        app = FoodDeliveryApp()
+        app = FoodDeliveryApp(self.db_path, shard_paths=self.shard_paths)
         class DummyUser:
             username = "dummy_manager"
             user_id = 1
@@ -303,6 +344,553 @@ class TestFoodDeliverySystem(unittest.TestCase):
                 app.show_manager_menu()
             output = captured_output.getvalue()
             self.assertIn("Menu Items:", output)
-    
+
+    def test_database_is_isolated(self):
+        print("Running test_database_is_isolated")
+        unique_username = "isolated_user_" + str(uuid.uuid4())
+        self.auth_manager.register_user(unique_username, "password123")
+        other_path, _, cleanup = make_temp_database()
+        try:
+            self.assertIsNone(AuthManager(other_path).login(unique_username, "password123"))
+        finally:
+            cleanup()
+
+    def test_recover_overdue_transitions(self):
+        print("Running test_recover_overdue_transitions")
+        user = self.auth_manager.login("valid_user", "password123")
+        takeaway_id = self.order_manager.create_order(user.user_id, [(1, 1)], "takeaway")
+        delivery_id = self.order_manager.create_order(user.user_id, [(2, 1)], "home_delivery")
+        assigned_agent = self.order_manager.get_order(delivery_id).assigned_agent
+        conn = self.connect_order_shard(delivery_id)
+        cursor = conn.cursor()
+        cursor.execute("UPDATE order_transitions SET due_time = '2000-01-01 00:00:00' WHERE order_id IN (?, ?)",
+                       (takeaway_id, delivery_id))
+        conn.commit()
+        conn.close()
+        recovered = OrderManager(self.db_path, shard_paths=self.shard_paths).recover_transitions()
+        self.assertEqual(recovered, 4)
+        self.assertEqual(self.order_manager.get_order(takeaway_id).status, "done")
+        order = self.order_manager.get_order(delivery_id)
+        self.assertEqual(order.status, "done")
+        self.assertEqual(order.time_remaining, 0)
+        agents = {agent.name: agent.status for agent in self.agent_manager.get_all_agents()}
+        self.assertEqual(agents[assigned_agent], "available")
+
+    def test_recover_keeps_future_transitions_pending(self):
+        print("Running test_recover_keeps_future_transitions_pending")
+        user = self.auth_manager.login("valid_user", "password123")
+        order_id = self.order_manager.create_order(user.user_id, [(1, 1)], "home_delivery")
+        conn = self.connect_order_shard(order_id)
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE order_transitions SET due_time = '2000-01-01 00:00:00'
+            WHERE order_id = ? AND status = 'out for delivery' AND time_remaining = 2
+        """, (order_id,))
+        conn.commit()
+        conn.close()
+        OrderManager(self.db_path, shard_paths=self.shard_paths).recover_transitions()
+        order = self.order_manager.get_order(order_id)
+        self.assertEqual(order.status, "out for delivery")
+        self.assertEqual(order.time_remaining, 2)
+        conn = self.connect_order_shard(order_id)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM order_transitions WHERE order_id = ? AND applied = 0", (order_id,))
+        self.assertEqual(cursor.fetchone()[0], 2)
+        conn.close()
+
+    def test_recover_skips_transitions_overtaken_by_later_ones(self):
+        print("Running test_recover_skips_transitions_overtaken_by_later_ones")
+        user = self.auth_manager.login("valid_user", "password123")
+        order_manager = OrderManager(self.db_path, run_lifecycle=False, shard_paths=self.shard_paths)
+        order_id = order_manager.create_order(user.user_id, [(1, 1)], "home_delivery")
+        conn = self.connect_order_shard(order_id)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM order_transitions WHERE order_id = ? ORDER BY due_time, id", (order_id,))
+        first, second, last = [row[0] for row in cursor.fetchall()]
+        for minute, transition_id in enumerate((first, second, last), start=1):
+            cursor.execute("UPDATE order_transitions SET due_time = ? WHERE id = ?",
+                           (f"2000-01-01 00:0{minute}:00", transition_id))
+        conn.commit()
+        conn.close()
+        # The middle transition is still waiting for a retry when the last one lands.
+        order_manager.apply_transition(first)
+        order_manager.apply_transition(last)
+        order_manager.catch_up_transitions()
+        order = order_manager.get_order(order_id)
+        self.assertEqual(order.status, "done")
+        self.assertEqual(order.time_remaining, 0)
+        agents = {agent.name: agent.status for agent in self.agent_manager.get_all_agents()}
+        self.assertEqual(agents[order.assigned_agent], "available")
+        conn = self.connect_order_shard(order_id)
+        cursor = conn.cursor()
+        cursor.execute("SELECT applied FROM order_transitions WHERE id = ?", (second,))
+        self.assertEqual(cursor.fetchone()[0], 1)
+        conn.close()
+
+    def test_catch_up_looks_up_transitions_by_order(self):
+        print("Running test_catch_up_looks_up_transitions_by_order")
+        statements = []
+        def tracing_connect(path):
+            conn = sqlite3.connect(path, uri=True)
+            conn.set_trace_callback(statements.append)
+            return conn
+        with patch('src.food_delivery._connect', side_effect=tracing_connect):
+            OrderManager(self.db_path, run_lifecycle=False, shard_paths=self.shard_paths).catch_up_transitions()
+        update = next(sql for sql in statements if sql.lstrip().startswith("UPDATE orders"))
+        conn = ShardRouter(self.db_path, self.shard_paths).connect(0)
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + update)]
+        conn.close()
+        # Per-order lookups must be index probes; a scan makes recovery quadratic in the backlog.
+        self.assertTrue(any("idx_order_transitions_order" in step for step in plan))
+        self.assertEqual([step for step in plan if step.startswith("SCAN")], [])
+
+    def test_recover_releases_orphaned_agent(self):
+        print("Running test_recover_releases_orphaned_agent")
+        user = self.auth_manager.login("valid_user", "password123")
+        order_manager = OrderManager(self.db_path, run_lifecycle=False, shard_paths=self.shard_paths)
+        kept_id = order_manager.create_order(user.user_id, [(1, 1)], "home_delivery")
+        lost_id = order_manager.create_order(user.user_id, [(1, 1)], "home_delivery")
+        kept_agent = order_manager.get_order(kept_id).assigned_agent
+        lost_agent = order_manager.get_order(lost_id).assigned_agent
+        # The agent's busy status committed but the order's shard commit did not.
+        conn = self.connect_order_shard(lost_id)
+        conn.execute("DELETE FROM order_transitions WHERE order_id = ?", (lost_id,))
+        conn.execute("DELETE FROM orders WHERE id = ?", (lost_id,))
+        conn.execute("DELETE FROM order_search WHERE rowid = ?", (lost_id,))
+        conn.commit()
+        conn.close()
+        order_manager.catch_up_transitions()
+        agents = {agent.name: agent.status for agent in self.agent_manager.get_all_agents()}
+        self.assertEqual(agents[lost_agent], "available")
+        self.assertEqual(agents[kept_agent], "busy")
+
+    def test_transition_applies_once(self):
+        print("Running test_transition_applies_once")
+        user = self.auth_manager.login("valid_user", "password123")
+        order_id = self.order_manager.create_order(user.user_id, [(1, 1)], "takeaway")
+        conn = self.connect_order_shard(order_id)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM order_transitions WHERE order_id = ?", (order_id,))
+        transition_id = cursor.fetchone()[0]
+        conn.close()
+        self.order_manager.apply_transition(transition_id)
+        self.assertEqual(self.order_manager.get_order(order_id).status, "done")
+        conn = self.connect_order_shard(order_id)
+        conn.execute("UPDATE orders SET status = 'preparing' WHERE id = ?", (order_id,))
+        conn.commit()
+        conn.close()
+        self.order_manager.apply_transition(transition_id)
+        self.assertEqual(self.order_manager.get_order(order_id).status, "preparing")
+
+    def test_scheduler_applies_due_transition(self):
+        print("Running test_scheduler_applies_due_transition")
+        user = self.auth_manager.login("valid_user", "password123")
+        order_id = self.order_manager.create_order(user.user_id, [(1, 1)], "takeaway")
+        conn = self.connect_order_shard(order_id)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM order_transitions WHERE order_id = ?", (order_id,))
+        transition_id = cursor.fetchone()[0]
+        conn.close()
+        self.order_manager.scheduler.schedule(transition_id, time.time())
+        for _ in range(50):
+            if self.order_manager.get_order(order_id).status == "done":
+                break
+            time.sleep(0.05)
+        self.assertEqual(self.order_manager.get_order(order_id).status, "done")
+
+    def test_scheduler_retries_failed_transition(self):
+        print("Running test_scheduler_retries_failed_transition")
+        user = self.auth_manager.login("valid_user", "password123")
+        order_manager = OrderManager(self.db_path, run_lifecycle=False, shard_paths=self.shard_paths)
+        order_id = order_manager.create_order(user.user_id, [(1, 1)], "home_delivery")
+        conn = self.connect_order_shard(order_id)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM order_transitions WHERE order_id = ? ORDER BY due_time", (order_id,))
+        transition_ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        failures = [sqlite3.OperationalError("database is locked"), RuntimeError("unexpected")]
+        def flaky_apply(transition_id):
+            if failures:
+                raise failures.pop(0)
+            order_manager.apply_transition(transition_id)
+        scheduler = LifecycleScheduler(flaky_apply, retry_delay=0.01)
+        for transition_id in transition_ids:
+            scheduler.schedule(transition_id, time.time())
+        for _ in range(100):
+            if order_manager.get_order(order_id).status == "done":
+                break
+            time.sleep(0.05)
+        order = order_manager.get_order(order_id)
+        self.assertEqual(order.status, "done")
+        self.assertEqual(failures, [])
+        agents = {agent.name: agent.status for agent in self.agent_manager.get_all_agents()}
+        self.assertEqual(agents[order.assigned_agent], "available")
+
+    def make_overdue_enqueued_order(self, delivery_type):
+        user = self.auth_manager.login("valid_user", "password123")
+        order_id = OrderManager(self.db_path, run_lifecycle=False, shard_paths=self.shard_paths).create_order(user.user_id, [(1, 1)], delivery_type)
+        conn = self.connect_order_shard(order_id)
+        conn.execute("UPDATE order_transitions SET due_time = '2000-01-01 00:00:00' WHERE order_id = ?", (order_id,))
+        conn.commit()
+        conn.close()
+        return order_id
+
+    def test_enqueue_only_order_waits_for_worker(self):
+        print("Running test_enqueue_only_order_waits_for_worker")
+        order_id = self.make_overdue_enqueued_order("home_delivery")
+        self.assertEqual(self.order_manager.get_order(order_id).status, "preparing")
+        worker = LifecycleWorker(self.db_path, "test-worker", shard_paths=self.shard_paths)
+        self.assertEqual(worker.run_once(), 3)
+        order = self.order_manager.get_order(order_id)
+        self.assertEqual(order.status, "done")
+        agents = {agent.name: agent.status for agent in self.agent_manager.get_all_agents()}
+        self.assertEqual(agents[order.assigned_agent], "available")
+        self.assertEqual(worker.run_once(), 0)
+
+    def test_workers_share_due_transitions(self):
+        print("Running test_workers_share_due_transitions")
+        first_id = self.make_overdue_enqueued_order("takeaway")
+        second_id = self.make_overdue_enqueued_order("takeaway")
+        first_worker = LifecycleWorker(self.db_path, "worker-a", batch_size=1, shard_paths=self.shard_paths)
+        second_worker = LifecycleWorker(self.db_path, "worker-b", batch_size=1, shard_paths=self.shard_paths)
+        first_claim = first_worker.claim_due_transitions()
+        second_claim = second_worker.claim_due_transitions()
+        self.assertEqual(len(first_claim), 1)
+        self.assertEqual(len(second_claim), 1)
+        self.assertNotEqual(first_claim, second_claim)
+        for transition_id in first_claim:
+            first_worker.order_manager.apply_transition(transition_id)
+        for transition_id in second_claim:
+            second_worker.order_manager.apply_transition(transition_id)
+        self.assertEqual(self.order_manager.get_order(first_id).status, "done")
+        self.assertEqual(self.order_manager.get_order(second_id).status, "done")
+
+    def test_expired_lease_is_reclaimed(self):
+        print("Running test_expired_lease_is_reclaimed")
+        order_id = self.make_overdue_enqueued_order("takeaway")
+        conn = self.connect_order_shard(order_id)
+        conn.execute("""
+            UPDATE order_transitions SET claimed_by = 'crashed-worker', lease_until = '2099-01-01 00:00:00'
+            WHERE order_id = ?
+        """, (order_id,))
+        conn.commit()
+        conn.close()
+        worker = LifecycleWorker(self.db_path, "test-worker", shard_paths=self.shard_paths)
+        self.assertEqual(worker.claim_due_transitions(), [])
+        conn = self.connect_order_shard(order_id)
+        conn.execute("UPDATE order_transitions SET lease_until = '2000-01-01 00:00:00' WHERE order_id = ?", (order_id,))
+        conn.commit()
+        conn.close()
+        self.assertEqual(worker.run_once(), 1)
+        self.assertEqual(self.order_manager.get_order(order_id).status, "done")
+
+    def test_worker_retries_catch_up_while_locked(self):
+        print("Running test_worker_retries_catch_up_while_locked")
+        worker = LifecycleWorker(self.db_path, "test-worker", poll_interval=0, shard_paths=self.shard_paths)
+        class StopWorker(Exception):
+            pass
+        catch_up = patch.object(worker.order_manager, 'catch_up_transitions',
+                                side_effect=[sqlite3.OperationalError("database is locked"), 0])
+        run_once = patch.object(worker, 'run_once', side_effect=StopWorker)
+        with catch_up as catch_up_mock, run_once:
+            with self.assertRaises(StopWorker):
+                worker.run()
+        self.assertEqual(catch_up_mock.call_count, 2)
+
+    def test_search_menu_prefix(self):
+        print("Running test_search_menu_prefix")
+        results = self.menu_manager.search_menu("burg")
+        self.assertEqual([item.name for item in results], ["Burger"])
+        self.assertEqual(self.menu_manager.search_menu("   "), [])
+
+    def test_search_menu_follows_menu_changes(self):
+        print("Running test_search_menu_follows_menu_changes")
+        unique_name = "Special" + uuid.uuid4().hex[:8]
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO menu (name, price) VALUES (?, ?)", (unique_name, 4.5))
+        item_id = cursor.lastrowid
+        conn.commit()
+        self.assertEqual([item.item_id for item in self.menu_manager.search_menu(unique_name)], [item_id])
+        cursor.execute("UPDATE menu SET name = 'Renamed Dish' WHERE id = ?", (item_id,))
+        conn.commit()
+        self.assertEqual(self.menu_manager.search_menu(unique_name), [])
+        self.assertIn(item_id, [item.item_id for item in self.menu_manager.search_menu("renamed")])
+        cursor.execute("DELETE FROM menu WHERE id = ?", (item_id,))
+        conn.commit()
+        conn.close()
+        self.assertNotIn(item_id, [item.item_id for item in self.menu_manager.search_menu("renamed")])
+
+    def test_search_orders_by_customer_and_agent(self):
+        print("Running test_search_orders_by_customer_and_agent")
+        unique_username = "searchable_" + uuid.uuid4().hex[:8]
+        self.auth_manager.register_user(unique_username, "password123")
+        user = self.auth_manager.login(unique_username, "password123")
+        takeaway_id = self.order_manager.create_order(user.user_id, [(1, 1)], "takeaway")
+        delivery_id = self.order_manager.create_order(user.user_id, [(2, 1)], "home_delivery")
+        results = self.order_manager.search_orders(unique_username[:-3])
+        self.assertEqual(sorted(order.order_id for order in results), sorted([takeaway_id, delivery_id]))
+        self.assertTrue(all(order.username == unique_username for order in results))
+        agent = self.order_manager.get_order(delivery_id).assigned_agent
+        agent_results = self.order_manager.search_orders(agent.split()[0].lower(), limit=1000)
+        self.assertIn(delivery_id, [order.order_id for order in agent_results])
+        self.assertEqual(len(self.order_manager.search_orders(unique_username, limit=1)), 1)
+
+    def test_search_orders_ranked_within_one_shard(self):
+        print("Running test_search_orders_ranked_within_one_shard")
+        if self.shard_paths:
+            self.skipTest("ranks are only compared within one shard")
+        prefix = "ranked" + uuid.uuid4().hex[:8]
+        # A username repeating the search term ranks higher; give those orders the older times.
+        strong_ids = self.place_search_orders(f"{prefix}_{prefix}", 3, "2001-01-01 00:00:0")
+        weak_ids = self.place_search_orders(f"{prefix}_weak", 3, "2001-01-01 00:00:1")
+        results = [order.order_id for order in self.order_manager.search_orders(prefix, limit=6)]
+        self.assertEqual(sorted(results[:3]), sorted(strong_ids))
+        self.assertEqual(sorted(results[3:]), sorted(weak_ids))
+        best = [order.order_id for order in self.order_manager.search_orders(prefix, limit=3)]
+        self.assertEqual(sorted(best), sorted(strong_ids))
+
+    def place_search_orders(self, username, count, time_prefix):
+        self.auth_manager.register_user(username, "password123")
+        user = self.auth_manager.login(username, "password123")
+        order_ids = []
+        for i in range(count):
+            order_id = self.order_manager.create_order(user.user_id, [(1, 1)], "takeaway")
+            conn = self.connect_order_shard(order_id)
+            conn.execute("UPDATE orders SET order_time = ? WHERE id = ?", (f"{time_prefix}{i}", order_id))
+            conn.commit()
+            conn.close()
+            order_ids.append(order_id)
+        return order_ids
+
+    def test_show_customer_menu_search_menu(self):
+        print("Running test_show_customer_menu_search_menu")
+        app = FoodDeliveryApp(self.db_path, shard_paths=self.shard_paths)
+        class DummyUser:
+            username = "dummy_customer"
+            user_id = 1
+        app.current_user = DummyUser()
+        with patch('builtins.input', side_effect=["4", "piz", ""]):
+            captured_output = io.StringIO()
+            with patch('sys.stdout', new=captured_output):
+                app.show_customer_menu()
+            output = captured_output.getvalue()
+            self.assertIn("Pizza", output)
+
+    def test_read_snapshot_staleness(self):
+        print("Running test_read_snapshot_staleness")
+        snapshot = ReadSnapshot(self.db_path, self.shard_paths, max_staleness=60)
+        try:
+            snapshot_orders = OrderManager(snapshot.db_path, run_lifecycle=False, shard_paths=snapshot.shard_paths)
+            self.assertTrue(snapshot.refresh())
+            user = self.auth_manager.login("valid_user", "password123")
+            order_id = self.order_manager.create_order(user.user_id, [(1, 1)], "takeaway")
+            self.assertFalse(snapshot.refresh())
+            self.assertIsNone(snapshot_orders.get_order(order_id))
+            self.assertTrue(snapshot.refresh(force=True))
+            self.assertEqual(snapshot_orders.get_order(order_id).order_id, order_id)
+            self.assertIn(order_id, [order.order_id for order in snapshot_orders.get_all_orders()])
+        finally:
+            snapshot.close()
+
+    def test_read_snapshot_copies_dashboard_tables_only(self):
+        print("Running test_read_snapshot_copies_dashboard_tables_only")
+        snapshot = ReadSnapshot(self.db_path, self.shard_paths)
+        try:
+            snapshot.refresh()
+            conn = sqlite3.connect(snapshot.db_path, uri=True)
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA table_info(users)")
+            self.assertNotIn("password", [column[1] for column in cursor.fetchall()])
+            cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'menu_fts'")
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute("SELECT username FROM users WHERE username = 'valid_user'")
+            self.assertEqual(cursor.fetchone()[0], "valid_user")
+            conn.close()
+            live_agents = [(agent.agent_id, agent.status) for agent in self.agent_manager.get_all_agents()]
+            snapshot_agents = DeliveryAgentManager(snapshot.db_path).get_all_agents()
+            self.assertEqual([(agent.agent_id, agent.status) for agent in snapshot_agents], live_agents)
+        finally:
+            snapshot.close()
+
+    def test_write_during_snapshot_refresh(self):
+        print("Running test_write_during_snapshot_refresh")
+        if not os.path.exists(self.db_path):
+            self.skipTest("shared-cache in-memory databases lock per table, not per file")
+        db_path = self.db_path
+        writes = []
+        class RefreshingConnection(sqlite3.Connection):
+            def execute(self, sql, *args):
+                cursor = super().execute(sql, *args)
+                if sql.startswith("INSERT INTO snapshot.") and not writes:
+                    # The copy's read transaction is open now; write to the live database meanwhile.
+                    writer = sqlite3.connect(db_path, timeout=0.05)
+                    writer.execute("UPDATE delivery_agents SET status = 'busy' WHERE id = 1")
+                    writer.commit()
+                    writer.close()
+                    writes.append(True)
+                return cursor
+        snapshot = ReadSnapshot(self.db_path, self.shard_paths)
+        try:
+            with patch('src.food_delivery._connect',
+                       side_effect=lambda path: sqlite3.connect(path, uri=True, factory=RefreshingConnection)):
+                self.assertTrue(snapshot.refresh())
+        finally:
+            snapshot.close()
+        self.assertTrue(writes)
+        agents = {agent.agent_id: agent.status for agent in self.agent_manager.get_all_agents()}
+        self.assertEqual(agents[1], "busy")
+
+    def test_view_all_orders_reads_snapshot(self):
+        print("Running test_view_all_orders_reads_snapshot")
+        app = FoodDeliveryApp(self.db_path, shard_paths=self.shard_paths, snapshot_staleness=0)
+        user = self.auth_manager.login("valid_user", "password123")
+        order_id = self.order_manager.create_order(user.user_id, [(1, 1)], "takeaway")
+        with patch('builtins.input', side_effect=["0"]):
+            captured_output = io.StringIO()
+            with patch('sys.stdout', new=captured_output):
+                app.view_all_orders()
+            output = captured_output.getvalue()
+            self.assertIn(f"Order #{order_id} ", output)
+        self.assertIsNotNone(app.read_snapshot.refreshed_at)
+        app.read_snapshot.close()
+
+    def test_password_is_stored_hashed(self):
+        print("Running test_password_is_stored_hashed")
+        unique_username = "hashed_user_" + str(uuid.uuid4())
+        self.auth_manager.register_user(unique_username, "password123")
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT password FROM users WHERE username = ?", (unique_username,))
+        stored = cursor.fetchone()[0]
+        conn.close()
+        self.assertNotIn("password123", stored)
+        self.assertTrue(stored.startswith("pbkdf2_sha256$"))
+        self.assertIsNotNone(self.auth_manager.login(unique_username, "password123"))
+        self.assertIsNone(self.auth_manager.login(unique_username, "password124"))
+
+    def test_plaintext_password_upgraded_on_login(self):
+        print("Running test_plaintext_password_upgraded_on_login")
+        unique_username = "legacy_user_" + str(uuid.uuid4())
+        conn = self.connect()
+        conn.execute("INSERT INTO users (username, password, user_type) VALUES (?, ?, ?)",
+                     (unique_username, "oldpass", "customer"))
+        conn.commit()
+        conn.close()
+        self.assertIsNone(self.auth_manager.login(unique_username, "wrongpass"))
+        user = self.auth_manager.login(unique_username, "oldpass")
+        self.assertIsNotNone(user)
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT password FROM users WHERE username = ?", (unique_username,))
+        self.assertTrue(cursor.fetchone()[0].startswith("pbkdf2_sha256$"))
+        conn.close()
+        self.assertIsNotNone(self.auth_manager.login(unique_username, "oldpass"))
+
+    def test_missing_or_malformed_password_never_matches(self):
+        print("Running test_missing_or_malformed_password_never_matches")
+        rows = {
+            "null_password_user_" + str(uuid.uuid4()): None,
+            "empty_password_user_" + str(uuid.uuid4()): "",
+            "bad_iterations_user_" + str(uuid.uuid4()): "pbkdf2_sha256$many$00$00",
+            "bad_salt_user_" + str(uuid.uuid4()): "pbkdf2_sha256$1000$zz$00",
+            "short_hash_user_" + str(uuid.uuid4()): "pbkdf2_sha256$1000",
+        }
+        conn = self.connect()
+        conn.executemany("INSERT INTO users (username, password, user_type) VALUES (?, ?, 'customer')", rows.items())
+        conn.commit()
+        conn.close()
+        for username in rows:
+            self.assertIsNone(self.auth_manager.login(username, ""))
+            self.assertIsNone(self.auth_manager.login(username, "password123"))
+
+    def test_session_token_skips_password_check(self):
+        print("Running test_session_token_skips_password_check")
+        user = self.auth_manager.login("valid_user", "password123")
+        self.assertTrue(user.session_token)
+        with patch('src.food_delivery.hashlib.pbkdf2_hmac') as pbkdf2_hmac:
+            session_user = self.auth_manager.authenticate(user.session_token)
+        pbkdf2_hmac.assert_not_called()
+        self.assertEqual(session_user.user_id, user.user_id)
+        self.auth_manager.logout(user.session_token)
+        self.assertIsNone(self.auth_manager.authenticate(user.session_token))
+        self.assertIsNone(self.auth_manager.authenticate("not-a-token"))
+
+    def test_session_cache_bounds(self):
+        print("Running test_session_cache_bounds")
+        cache = SessionCache(max_size=2, ttl=60)
+        cache.put("a", "user_a")
+        cache.put("b", "user_b")
+        self.assertEqual(cache.get("a"), "user_a")
+        cache.put("c", "user_c")
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "user_a")
+        expiring = SessionCache(ttl=0.05)
+        expiring.put("token", "user")
+        self.assertEqual(expiring.get("token"), "user")
+        time.sleep(0.1)
+        self.assertIsNone(expiring.get("token"))
+        self.assertEqual(len(expiring), 0)
+
+class TestFoodDeliverySystemInMemory(TestFoodDeliverySystem):
+    make_database = staticmethod(make_memory_database)
+
+class TestFoodDeliverySystemSharded(TestFoodDeliverySystem):
+    shard_count = 3
+
+    def test_orders_are_routed_by_user(self):
+        print("Running test_orders_are_routed_by_user")
+        router = ShardRouter(self.db_path, self.shard_paths)
+        placed = {}
+        for _ in range(6):
+            unique_username = "sharded_user_" + str(uuid.uuid4())
+            self.auth_manager.register_user(unique_username, "password123")
+            user = self.auth_manager.login(unique_username, "password123")
+            placed[user.user_id] = self.order_manager.create_order(user.user_id, [(1, 1)], "takeaway")
+        for user_id, order_id in placed.items():
+            self.assertEqual(router.shard_for_order(order_id), router.shard_for_user(user_id))
+            conn = router.connect(router.shard_for_user(user_id))
+            cursor = conn.cursor()
+            cursor.execute("SELECT user_id FROM main.orders WHERE id = ?", (order_id,))
+            self.assertEqual(cursor.fetchone()[0], user_id)
+            conn.close()
+            self.assertEqual([order.order_id for order in self.order_manager.get_user_orders(user_id)], [order_id])
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM orders")
+        self.assertEqual(cursor.fetchone()[0], 0)
+        conn.close()
+
+    def test_get_all_orders_merges_shards(self):
+        print("Running test_get_all_orders_merges_shards")
+        for _ in range(3):
+            unique_username = "merged_user_" + str(uuid.uuid4())
+            self.auth_manager.register_user(unique_username, "password123")
+            user = self.auth_manager.login(unique_username, "password123")
+            self.order_manager.create_order(user.user_id, [(1, 1)], "takeaway")
+        orders = self.order_manager.get_all_orders()
+        order_times = [order.order_time for order in orders]
+        self.assertEqual(order_times, sorted(order_times, reverse=True))
+        shards = {ShardRouter(self.db_path, self.shard_paths).shard_for_order(order.order_id) for order in orders}
+        self.assertGreater(len(shards), 1)
+        self.assertEqual(len({order.order_id for order in orders}), len(orders))
+
+    def test_search_orders_merges_shards_newest_first(self):
+        print("Running test_search_orders_merges_shards_newest_first")
+        prefix = "shardsearch" + uuid.uuid4().hex[:8]
+        router = ShardRouter(self.db_path, self.shard_paths)
+        # Better-ranked but older matches must not crowd out the newest ones.
+        older = [self.place_search_orders(f"{prefix}_{prefix}_{i}", 1, "2001-01-01 00:00:0")[0] for i in range(6)]
+        newer = [self.place_search_orders(f"{prefix}_{i}", 1, "2001-01-01 00:00:1")[0] for i in range(6)]
+        results = self.order_manager.search_orders(prefix, limit=1000)
+        self.assertEqual(sorted(order.order_id for order in results), sorted(older + newer))
+        self.assertGreater(len({router.shard_for_order(order.order_id) for order in results}), 1)
+        order_times = [order.order_time for order in results]
+        self.assertEqual(order_times, sorted(order_times, reverse=True))
+        newest = self.order_manager.search_orders(prefix, limit=2)
+        self.assertEqual(len(newest), 2)
+        self.assertTrue(all(order.order_id in newer for order in newest))
+
 if __name__ == '__main__':
     unittest.main()